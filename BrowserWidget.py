@@ -0,0 +1,315 @@
+import sys, os
+import hashlib
+import numpy as np
+
+from PyQt5 import QtWidgets
+from PyQt5.QtWidgets import (QWidget, QApplication, QPushButton, QLineEdit,
+QHBoxLayout, QVBoxLayout, QLabel, QTableView, QAbstractItemView, QHeaderView,
+)
+from PyQt5.QtCore import (Qt, QDir, QSize, QPointF, QObject, QRunnable,
+QThreadPool, QAbstractTableModel, QModelIndex, pyqtSignal,
+)
+from PyQt5.QtGui import QImage, QPainter, QPen, QColor, QPolygonF
+
+# user defined package
+from reader import read_file, read_header
+from utils import decimate
+from style_sheet import push_button_style, text_style
+
+
+THUMBNAIL_SIZE = QSize(160, 48)
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "app_demo", "thumbnails")
+# number of files read by one header task
+HEADER_CHUNK = 64
+# thread pool priority of thumbnails over header tasks (priority 0)
+THUMBNAIL_PRIORITY = 1
+
+
+def thumbnail_cache_path(path_filename, size=THUMBNAIL_SIZE):
+	"""
+	Cache file of the thumbnail, the key changes whenever the file is modified.
+	"""
+	stat = os.stat(path_filename)
+	key = f"{os.path.abspath(path_filename)}|{stat.st_mtime_ns}|{stat.st_size}|{size.width()}x{size.height()}"
+	return os.path.join(THUMBNAIL_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".png")
+
+def render_thumbnail(x, y, size=THUMBNAIL_SIZE):
+	"""
+	Draw the decimated spectrum into a QImage, binding energy decreasing
+	from left to right like in the FitWidget plot.
+	"""
+	width, height = size.width(), size.height()
+	image = QImage(size, QImage.Format_ARGB32)
+	image.fill(Qt.white)
+	x, y = decimate(x, y, 2 * width)
+	if x.size < 2:
+		return image
+	x_range = max(1e-12, np.ptp(x))
+	y_range = max(1e-12, np.ptp(y))
+	px = (x.max() - x) / x_range * (width - 1)
+	py = (y.max() - y) / y_range * (height - 1)
+	painter = QPainter(image)
+	painter.setRenderHint(QPainter.Antialiasing)
+	painter.setPen(QPen(QColor("blue"), 1))
+	painter.drawPolyline(QPolygonF([QPointF(a, b) for a, b in zip(px, py)]))
+	painter.end()
+	return image
+
+def summarize_header(data):
+	"""
+	Collect the columns shown in the browser from the header of a file.
+	"""
+	region = data.metadata.get("Region 1", {})
+	low = region.get("Low Energy", "")
+	high = region.get("High Energy", "")
+	return {
+		"regions": data.info.get("Number of Regions", ""),
+		"name": ", ".join(meta.get("Region Name", "") for meta in data.metadata.values()),
+		"pass_energy": region.get("Pass Energy", ""),
+		"excitation_energy": region.get("Excitation Energy", ""),
+		"energy_range": f"{low} - {high}" if low or high else "",
+	}
+
+
+class WorkerSignals(QObject):
+	"""
+	Signals of the background tasks, QRunnable itself can not emit.
+	"""
+	headers = pyqtSignal(int, list)
+	thumbnail = pyqtSignal(int, int, QImage)
+
+
+class HeaderTask(QRunnable):
+	"""
+	Read the headers of a chunk of files and report them together.
+	"""
+	def __init__(self, generation, rows):
+		super().__init__()
+		self.generation = generation
+		self.rows = rows
+		self.signals = WorkerSignals()
+
+	def run(self):
+		results = []
+		for row, path_filename in self.rows:
+			try:
+				results.append((row, summarize_header(read_header(path_filename))))
+			except Exception:
+				# a malformed file must not drop the rest of the chunk
+				results.append((row, None))
+		self.signals.headers.emit(self.generation, results)
+
+
+class ThumbnailTask(QRunnable):
+	"""
+	Load the thumbnail of one file from the disk cache, or read the
+	spectrum, render and cache it.
+	"""
+	def __init__(self, generation, row, path_filename):
+		super().__init__()
+		self.generation = generation
+		self.row = row
+		self.path_filename = path_filename
+		self.signals = WorkerSignals()
+
+	def run(self):
+		image = QImage()
+		try:
+			cache_path = thumbnail_cache_path(self.path_filename)
+			if os.path.isfile(cache_path):
+				image.load(cache_path)
+			if image.isNull():
+				data = read_file(self.path_filename)
+				if "Region 1" in data.spectrum:
+					spectrum = data.spectrum["Region 1"]
+					image = render_thumbnail(spectrum[:,0], spectrum[:,1])
+					os.makedirs(THUMBNAIL_CACHE_DIR, exist_ok=True)
+					image.save(cache_path, "PNG")
+		except Exception:
+			image = QImage()
+		self.signals.thumbnail.emit(self.generation, self.row, image)
+
+
+class FileTableModel(QAbstractTableModel):
+	"""
+	Table of the spectrum files in a directory. Headers are scanned on
+	the thread pool, thumbnails are only requested for the rows the
+	view asks to display.
+	"""
+	columns = ["Preview", "File", "Regions", "Region Name", "Pass Energy",
+	"Excitation Energy", "Energy Range"]
+	keys = [None, None, "regions", "name", "pass_energy", "excitation_energy", "energy_range"]
+
+	scanProgress = pyqtSignal(int, int)
+
+	def __init__(self, parent=None):
+		super().__init__(parent)
+		self.pool = QThreadPool.globalInstance()
+		self.generation = 0
+		self.files = []
+		self.headers = {}
+		self.thumbnails = {}
+		self.pending = set()
+
+	def set_directory(self, directory, suffix=".txt"):
+		# drop the tasks of the previous directory which did not start yet
+		self.pool.clear()
+		self.beginResetModel()
+		self.generation += 1
+		with os.scandir(directory) as entries:
+			self.files = sorted(entry.path for entry in entries
+			if entry.is_file() and entry.name.lower().endswith(suffix))
+		self.headers = {}
+		self.thumbnails = {}
+		self.pending = set()
+		self.endResetModel()
+		self.scanProgress.emit(0, len(self.files))
+
+		for start in range(0, len(self.files), HEADER_CHUNK):
+			rows = [(row, self.files[row]) for row in range(start, min(start + HEADER_CHUNK, len(self.files)))]
+			task = HeaderTask(self.generation, rows)
+			task.signals.headers.connect(self.on_headers)
+			self.pool.start(task)
+
+	def path(self, row):
+		return self.files[row]
+
+	def rowCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else len(self.files)
+
+	def columnCount(self, parent=QModelIndex()):
+		return 0 if parent.isValid() else len(self.columns)
+
+	def headerData(self, section, orientation, role=Qt.DisplayRole):
+		if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+			return self.columns[section]
+		return None
+
+	def data(self, index, role=Qt.DisplayRole):
+		if not index.isValid():
+			return None
+		row, col = index.row(), index.column()
+		if col == 0:
+			if role == Qt.DecorationRole:
+				# only called for visible rows, so thumbnails are built lazily
+				if row in self.thumbnails:
+					return self.thumbnails[row]
+				self.request_thumbnail(row)
+			elif role == Qt.SizeHintRole:
+				return THUMBNAIL_SIZE
+			return None
+		if role == Qt.DisplayRole:
+			if col == 1:
+				return os.path.basename(self.files[row])
+			header = self.headers.get(row)
+			if header is None:
+				return "..." if row not in self.headers else "unreadable"
+			return header[self.keys[col]]
+		return None
+
+	def request_thumbnail(self, row):
+		if row in self.pending:
+			return
+		self.pending.add(row)
+		task = ThumbnailTask(self.generation, row, self.files[row])
+		task.signals.thumbnail.connect(self.on_thumbnail)
+		# visible rows go ahead of the queued header scan
+		self.pool.start(task, THUMBNAIL_PRIORITY)
+
+	def on_headers(self, generation, results):
+		if generation != self.generation:
+			return
+		for row, header in results:
+			self.headers[row] = header
+		rows = [row for row, _ in results]
+		self.dataChanged.emit(self.index(min(rows), 1), self.index(max(rows), len(self.columns) - 1))
+		self.scanProgress.emit(len(self.headers), len(self.files))
+
+	def on_thumbnail(self, generation, row, image):
+		if generation != self.generation:
+			return
+		self.thumbnails[row] = image
+		index = self.index(row, 0)
+		self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+
+class BrowserWidget(QWidget):
+	"""
+	Overview of all spectra in a folder, double click a row to open it.
+	"""
+	fileSelected = pyqtSignal(str)
+
+	def __init__(self, directory=None):
+		super().__init__()
+		self.setStyleSheet(push_button_style)
+		self.dir = directory if directory is not None else QDir.currentPath()
+		self.setUi()
+		self.scan(self.dir)
+
+	def setUi(self):
+		self.setWindowTitle("Browse Spectra")
+		self.setGeometry(300, 300, 1000, 700)
+
+		# add folder button
+		self.b_folder = QPushButton('Folder', self)
+		self.b_folder.clicked.connect(self.open_folder)
+
+		self.l_dir = QLineEdit()
+		self.l_dir.setAlignment(Qt.AlignLeft)
+		self.l_dir.setStyleSheet(text_style)
+		self.l_dir.returnPressed.connect(lambda: self.scan(self.l_dir.text()))
+
+		folder_layout = QHBoxLayout()
+		folder_layout.addWidget(self.b_folder)
+		folder_layout.addWidget(self.l_dir)
+
+		self.model = FileTableModel(self)
+		self.model.scanProgress.connect(self.update_progress)
+
+		self.table = QTableView()
+		self.table.setModel(self.model)
+		self.table.setStyleSheet(text_style)
+		self.table.setIconSize(THUMBNAIL_SIZE)
+		self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+		self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+		self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+		self.table.verticalHeader().setDefaultSectionSize(THUMBNAIL_SIZE.height() + 4)
+		self.table.horizontalHeader().setStretchLastSection(True)
+		self.table.setColumnWidth(0, THUMBNAIL_SIZE.width() + 8)
+		self.table.doubleClicked.connect(self.select_file)
+
+		self.lb_progress = QLabel()
+		self.lb_progress.setStyleSheet(text_style)
+
+		layout = QVBoxLayout()
+		layout.addLayout(folder_layout)
+		layout.addWidget(self.table)
+		layout.addWidget(self.lb_progress)
+		self.setLayout(layout)
+
+	def open_folder(self):
+		directory = QtWidgets.QFileDialog.getExistingDirectory(self, 'Open folder', self.dir)
+		if directory != "":
+			self.scan(directory)
+
+	def scan(self, directory):
+		if not os.path.isdir(directory):
+			self.lb_progress.setText("Can not find the folder!")
+			return
+		self.dir = directory
+		self.l_dir.setText(directory)
+		self.model.set_directory(directory)
+
+	def update_progress(self, done, total):
+		self.lb_progress.setText(f"Scanned {done} of {total} files")
+
+	def select_file(self, index):
+		self.fileSelected.emit(self.model.path(index.row()))
+
+
+if __name__ == '__main__':
+	app = QApplication(sys.argv)
+	w = BrowserWidget()
+	w.fileSelected.connect(print)
+	w.show()
+	sys.exit(app.exec_())
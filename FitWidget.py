@@ -13,17 +13,24 @@ QDoubleSpinBox, QLabel, QComboBox, QTextEdit, QAbstractSpinBox,
 )
 from PyQt5.QtCore import QDir, Qt
 
-from lmfit import CompositeModel, Model
-from lmfit.models import GaussianModel
-from lmfit.lineshapes import gaussian
+from lmfit import CompositeModel, Model, Parameters
 
 # user defined package
 from reader import read_file
+from BrowserWidget import BrowserWidget
+from session import Session, save_session, dump_result, load_result
+from fit_cache import FitCache
+from models import (GaussianPeakModel, LinearBackgroundModel, ShirleyModel, 
+TougaardModel, jacobian_fit_kws)
 from utils import (fwhm2sigma, sigma2fwhm, calculate_height, instr_delta_e, 
-fermi_dirac, convolve, timestamp, normalize, shirley_baseline)
+fermi_dirac, gaussian, Convolver, timestamp, normalize, shirley_baseline)
 from style_sheet import push_button_style, spin_box_style, text_style
 
 
+# spin boxes restored from a session, derived ones follow through their signals
+SESSION_SPIN_BOXES = ["dsb_center", "dsb_area", "dsb_fwhm", "dsb_chi_sqr", "dsb_temp",
+"dsb_fermi_ctr", "dsb_beaml_e", "dsb_fermi_amp", "dsb_conv_e"]
+
 def getDoubleSpinBox():
 	box = QDoubleSpinBox()
 	box.setMinimum(float("-inf"))
@@ -41,6 +48,8 @@ class FitWidget(QWidget):
 		self.setStyleSheet(push_button_style + spin_box_style)
 		# self.setStyleSheet(label_style)
 		# self.setStyleSheet(spin_box_style)
+		# identical fits are answered from the cache
+		self.fit_cache = FitCache()
 		self.setUi()
 
 	def setUi(self):
@@ -104,6 +113,10 @@ class FitWidget(QWidget):
 		self.b_open.setFocus()
 		self.b_open.clicked.connect(self.open_file)
 
+		# add browse folder button
+		self.b_browse = QPushButton('Browse', self)
+		self.b_browse.clicked.connect(self.browse)
+
 		# Current directory
 		self.dir = QDir.currentPath()
 
@@ -117,6 +130,7 @@ class FitWidget(QWidget):
 		# open file group
 		open_file_layout = QHBoxLayout()
 		open_file_layout.addWidget(self.b_open)
+		open_file_layout.addWidget(self.b_browse)
 		open_file_layout.addWidget(self.l_path_file)
 
 
@@ -160,6 +174,14 @@ class FitWidget(QWidget):
 		self.dsb_height.setButtonSymbols(2)
 		self.dsb_height.setStyleSheet(text_style)
 		form_layout.addRow(lb_height, self.dsb_height)	
+
+		# background fitted together with the peak
+		self.bg_models = {"Linear": LinearBackgroundModel, "Shirley": ShirleyModel, "Tougaard": TougaardModel}
+		lb_bg = QLabel("Background")
+		self.comb_bg = QComboBox(self)
+		self.comb_bg.addItems(["None"] + list(self.bg_models))
+		self.comb_bg.setStyleSheet(text_style)
+		form_layout.addRow(lb_bg, self.comb_bg)
 			
 		lb_chi_sqr = QLabel("Reduced Chi-Sqr")
 		self.dsb_chi_sqr = getDoubleSpinBox()
@@ -231,10 +253,18 @@ class FitWidget(QWidget):
 		self.b_fit  = QPushButton('&Fit', self)
 		self.b_fit.clicked.connect(self.fit)
 
+		# add save and load session buttons
+		self.b_save  = QPushButton('&Save', self)
+		self.b_save.clicked.connect(self.save_session)
+		self.b_load  = QPushButton('&Load', self)
+		self.b_load.clicked.connect(self.load_session)
+
 		v_layout = QHBoxLayout()
 		v_layout.addWidget(self.b_guess)
 		v_layout.addWidget(self.b_preview)
 		v_layout.addWidget(self.b_fit)
+		v_layout.addWidget(self.b_save)
+		v_layout.addWidget(self.b_load)
 
 		self.text_edit = QTextEdit()
 		self.text_edit.setStyleSheet("font-size: 11pt; font: Arial")
@@ -271,10 +301,19 @@ class FitWidget(QWidget):
 		pathfile_name, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Open file', self.dir)
 		if pathfile_name != "":
 			# print(pathfile_name)
-			self.filepath = pathfile_name
-			self.dir = os.path.dirname(pathfile_name)
-			self.l_path_file.setText(pathfile_name)
-			self.read()
+			self.load_file(pathfile_name)
+
+	def browse(self):
+		# overview of all spectra in the current folder
+		self.browser = BrowserWidget(self.dir)
+		self.browser.fileSelected.connect(self.load_file)
+		self.browser.show()
+
+	def load_file(self, pathfile_name):
+		self.filepath = pathfile_name
+		self.dir = os.path.dirname(pathfile_name)
+		self.l_path_file.setText(pathfile_name)
+		self.read()
 	
 	def read(self):
 		# read file and plot int he figure
@@ -313,7 +352,7 @@ class FitWidget(QWidget):
 		if self.has_data():
 			if self.comb_func.currentIndex() == 0:
 				self.setup_gauss_model()
-				self.gauss_pars = self.gauss_model.guess(self.y0, x=self.x0)
+				self.gauss_pars.update(GaussianPeakModel().guess(self.y0, x=self.x0))
 				self.dsb_center.setValue(self.gauss_pars["center"])
 				self.dsb_area.setValue(self.gauss_pars["amplitude"])
 				self.dsb_fwhm.setValue(sigma2fwhm(self.gauss_pars["sigma"]))
@@ -330,7 +369,7 @@ class FitWidget(QWidget):
 		if self.has_data():
 			if self.comb_func.currentIndex() == 0:
 				self.setup_gauss_model()
-				self.eval_gauss_result = self.gauss_model.eval(self.gauss_pars, x=self.x0)	
+				self.eval_gauss_result = self.gauss_model.eval(self.gauss_pars, **self.model_kws(self.gauss_model))	
 				self.plot_preview_result()
 			elif self.comb_func.currentIndex() == 1:
 				self.setup_fermi_model()
@@ -367,7 +406,8 @@ class FitWidget(QWidget):
 				self.plot_result()
 
 	def setup_fermi_model(self):
-		self.fermi_model = CompositeModel(Model(fermi_dirac), Model(gaussian), convolve)
+		# one workspace per model, the convolution reuses its padding buffer
+		self.fermi_model = CompositeModel(Model(fermi_dirac), Model(gaussian), Convolver())
 		self.fermi_pars = self.fermi_model.make_params()
 		self.fermi_pars['amplitude'].set(self.dsb_fermi_amp.value())
 		self.fermi_pars['center'].set(self.dsb_fermi_ctr.value()/1000)
@@ -405,8 +445,15 @@ class FitWidget(QWidget):
 			pkcenter = self.gauss_results.params["center"].value
 			pkheight = calculate_height(self.gauss_results.params["amplitude"].value,
 			self.gauss_results.params["sigma"].value )
-			self.a_top.fill_between(self.x0, self.gauss_results.best_fit, color="r", alpha=0.5)
-			self.a_top.vlines(pkcenter, ymin=0, ymax=pkheight, color="k", linestyles="dashed")
+			comps = self.gauss_results.eval_components(**self.model_kws(self.gauss_results.model))
+			background = comps.get("bg_", 0)
+			pkbase = 0
+			if "bg_" in comps:
+				self.a_top.plot(self.x0, background, 'k--', label="background")
+				order = np.argsort(self.x0)
+				pkbase = np.interp(pkcenter, self.x0[order], background[order])
+			self.a_top.fill_between(self.x0, self.gauss_results.best_fit, background, color="r", alpha=0.5)
+			self.a_top.vlines(pkcenter, ymin=pkbase, ymax=pkbase + pkheight, color="k", linestyles="dashed")
 
 			# display fitting results in the plot.
 			area = self.gauss_results.params["amplitude"].value
@@ -446,19 +493,107 @@ class FitWidget(QWidget):
 		self.update_plot()
 	
 	def setup_gauss_model(self):
-		self.gauss_model = GaussianModel()
+		self.gauss_model = GaussianPeakModel()
 		self.gauss_pars = self.gauss_model.make_params()
 		self.gauss_pars['center'].set(self.dsb_center.value())
 		self.gauss_pars['sigma'].set(self.dsb_sigma.value())
 		self.gauss_pars['amplitude'].set(self.dsb_area.value())
-
-	def fermi_fit(self):
+		if self.comb_bg.currentText() in self.bg_models:
+			bg_model = self.bg_models[self.comb_bg.currentText()]()
+			self.gauss_pars.update(bg_model.guess(self.y0, x=self.x0))
+			self.gauss_model = self.gauss_model + bg_model
+
+	def model_kws(self, model):
+		# Shirley and Tougaard backgrounds need the spectrum as well
+		kws = {"x": self.x0}
+		if "y" in model.independent_vars:
+			kws["y"] = self.y0
+		return kws
+
+	def fermi_fit(self, method = "leastsq"):
 		if hasattr(self,"fermi_model"):
-			self.fermi_results = self.fermi_model.fit(self.y0, self.fermi_pars, x=self.x0, nan_policy="omit")
+			self.fermi_results = self.fit_cache.fit(self.fermi_model, self.y0, self.fermi_pars, x=self.x0, method=method, 
+			nan_policy="omit")
 
 	def gauss_fit(self, method = "leastsq"):
 		if hasattr(self,"gauss_model"):
-			self.gauss_results = self.gauss_model.fit(self.y0, self.gauss_pars, x=self.x0, method=method, nan_policy="omit")
+			fit_kws = jacobian_fit_kws(self.gauss_model) if method == "leastsq" else None
+			self.gauss_results = self.fit_cache.fit(self.gauss_model, self.y0, self.gauss_pars, method=method, 
+			nan_policy="omit", fit_kws=fit_kws, **self.model_kws(self.gauss_model))
+
+	def save_session(self):
+		pathfile_name, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Save session', self.dir, "Session (*.session)")
+		if pathfile_name != "":
+			self.write_session(pathfile_name)
+
+	def load_session(self):
+		pathfile_name, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Load session', self.dir, "Session (*.session)")
+		if pathfile_name != "":
+			self.read_session(pathfile_name)
+
+	def write_session(self, pathfile_name):
+		# spectrum, user inputs, parameters and fit results in one binary file
+		header = {
+			"filepath": getattr(self, "filepath", ""),
+			"function": self.comb_func.currentIndex(),
+			"background": self.comb_bg.currentText(),
+			"values": {name: getattr(self, name).value() for name in SESSION_SPIN_BOXES},
+			"report": self.text_edit.toPlainText(),
+		}
+		arrays = {}
+		if self.has_data():
+			arrays["x0"] = self.x0
+			arrays["y0"] = self.y0
+		for name in ("gauss", "fermi"):
+			if hasattr(self, f"{name}_pars"):
+				header[f"{name}_pars"] = getattr(self, f"{name}_pars").dumps()
+			if hasattr(self, f"{name}_results"):
+				entry, result_arrays = dump_result(getattr(self, f"{name}_results"), name)
+				header[f"{name}_results"] = entry
+				arrays.update(result_arrays)
+		save_session(pathfile_name, header, arrays)
+
+	def read_session(self, pathfile_name):
+		# restore a saved session without refitting
+		session = Session(pathfile_name)
+		header = session.header
+		self.dir = os.path.dirname(pathfile_name)
+		self.comb_func.setCurrentIndex(header["function"])
+		self.comb_bg.setCurrentText(header["background"])
+		for name, value in header["values"].items():
+			getattr(self, name).setValue(value)
+		if "x0" in session:
+			self.filepath = header["filepath"]
+			self.l_path_file.setText(self.filepath)
+			self.x0 = session.array("x0")
+			self.y0 = session.array("y0")
+
+			if "gauss_pars" in header:
+				self.setup_gauss_model()
+				self.gauss_pars = Parameters().loads(header["gauss_pars"])
+			if "gauss_results" in header:
+				entry = header["gauss_results"]
+				self.gauss_results = load_result(session, entry, "gauss", self.gauss_model, self.y0, 
+				**self.model_kws(self.gauss_model))
+				self.remember_result(self.gauss_results)
+			if "fermi_pars" in header:
+				self.setup_fermi_model()
+				self.fermi_pars = Parameters().loads(header["fermi_pars"])
+			if "fermi_results" in header:
+				entry = header["fermi_results"]
+				self.fermi_results = load_result(session, entry, "fermi", self.fermi_model, self.y0, x=self.x0)
+				self.remember_result(self.fermi_results)
+
+			if hasattr(self, ["gauss_results", "fermi_results"][self.comb_func.currentIndex()]):
+				self.plot_result()
+			else:
+				self.plot()
+		self.text_edit.setPlainText(header["report"])
+
+	def remember_result(self, result):
+		# restored results answer the same fit request without refitting
+		if hasattr(result, "fit_key"):
+			self.fit_cache.put(result.fit_key, result)
 
 			
 	def has_data(self):
@@ -0,0 +1,64 @@
+import timeit
+import tracemalloc
+import numpy as np
+
+from utils import fermi_dirac, gaussian, convolve, fermi_gauss, Workspace, K_B
+
+
+def fermi_dirac_ref(x, tempr, Ef):
+    """Previous Fermi Dirac implementation, overflows at low temperature."""
+    kt = K_B * tempr
+    return 1.0 /(np.exp(-(x-Ef)/max(1e-12, kt)) + 1)
+
+def gaussian_ref(x, amplitude, center, sigma):
+    """lmfit.lineshapes.gaussian"""
+    return ((amplitude/(max(1e-15, np.sqrt(2*np.pi)*sigma)))
+            * np.exp(-(1.0*x-center)**2 / max(1e-15, (2*sigma**2))))
+
+def convolve_ref(arr, kernel):
+    npts = min(arr.size, kernel.size)
+    pad = np.ones(npts)
+    tmp = np.concatenate((pad*arr[0], arr, pad*arr[-1]))
+    out = np.convolve(tmp, kernel, mode='valid')
+    noff = int((len(out) - npts) / 2)
+    return out[noff:noff+npts]
+
+def fermi_gauss_ref(x, tempr, Ef, amplitude, center, sigma):
+    return convolve_ref(fermi_dirac_ref(x, tempr, Ef), gaussian_ref(x, amplitude, center, sigma))
+
+def peak_memory(func, *args, **kwargs):
+    """Peak traced memory in bytes of a single call."""
+    tracemalloc.start()
+    func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def report(name, func, args, kwargs={}, number=2000):
+    sec = timeit.timeit(lambda: func(*args, **kwargs), number=number) / number
+    peak = peak_memory(func, *args, **kwargs)
+    print(f"{name:<24s} {sec*1e6:10.1f} us {peak/1024:10.1f} KiB")
+
+
+if __name__ == '__main__':
+    x = np.linspace(-0.5, 0.5, 2001)
+    fd_args = (x, 30.0, 0.01)
+    gs_args = (x, 1.0, 0.0, 0.05)
+    fg_args = fd_args + gs_args[1:]
+    work = Workspace()
+
+    with np.errstate(over="ignore"):
+        assert np.allclose(fermi_dirac(*fd_args), fermi_dirac_ref(*fd_args))
+        assert np.allclose(fermi_gauss(*fg_args, work=work), fermi_gauss_ref(*fg_args))
+    assert np.allclose(gaussian(*gs_args), gaussian_ref(*gs_args))
+
+    print(f"{'kernel':<24s} {'time':>13s} {'peak mem':>14s}")
+    with np.errstate(over="ignore"):
+        report("fermi_dirac (old)", fermi_dirac_ref, fd_args)
+    report("fermi_dirac", fermi_dirac, fd_args)
+    report("gaussian (lmfit)", gaussian_ref, gs_args)
+    report("gaussian", gaussian, gs_args)
+    with np.errstate(over="ignore"):
+        report("fermi_gauss (old)", fermi_gauss_ref, fg_args, number=200)
+    report("fermi_gauss", fermi_gauss, fg_args, number=200)
+    report("fermi_gauss (work)", fermi_gauss, fg_args, {"work": work}, number=200)
@@ -0,0 +1,240 @@
+import os
+import sys
+import hashlib
+import functools
+from collections import OrderedDict
+import numpy as np
+import lmfit
+
+# user defined package
+from session import Session, save_session, dump_result, load_result
+
+FIT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "app_demo", "fits")
+
+
+# bump when code outside the modules hashed by _hash_source changes fit results
+CACHE_VERSION = 1
+
+
+def model_description(model):
+    """
+    Stable text description of a (composite) lmfit model, unlike repr()
+    it contains no memory addresses.
+    """
+    if hasattr(model, "left"):
+        return f"({model_description(model.left)} {model.op.__name__} {model_description(model.right)})"
+    return f"{model.func.__module__}.{model.func.__name__}[{model.prefix}]"
+
+@functools.lru_cache(maxsize=None)
+def _module_digest(module_name):
+    """Hash of the source file of a module, its name for built-in modules."""
+    path_filename = getattr(sys.modules.get(module_name), "__file__", None)
+    if path_filename is None:
+        return module_name
+    with open(path_filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _model_modules(model):
+    if hasattr(model, "left"):
+        op_module = getattr(model.op, "__module__", None) or type(model.op).__module__
+        return _model_modules(model.left) | _model_modules(model.right) | {op_module}
+    return {model.func.__module__}
+
+def _hash_source(h, model):
+    # whole source files of the modules defining the model functions and the
+    # operator, so edits to their helpers, literals and constants (e.g. K_B in
+    # utils) invalidate the cache as well
+    for module_name in sorted(_model_modules(model)):
+        h.update(_module_digest(module_name).encode())
+
+def _hash_value(h, value):
+    if callable(value):
+        # e.g. the analytic Dfun, it changes how the optimum is found, not which
+        return
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(str(key).encode())
+            _hash_value(h, value[key])
+    elif isinstance(value, (np.ndarray, list, tuple)):
+        arr = np.ascontiguousarray(value)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.tobytes() if arr.dtype != object else repr(value).encode())
+    else:
+        h.update(repr(value).encode())
+
+def _hash_inputs(model, data, method, kws):
+    h = hashlib.sha1(f"app_demo fit cache {CACHE_VERSION} lmfit {lmfit.__version__}".encode())
+    h.update(model_description(model).encode())
+    _hash_source(h, model)
+    h.update(method.encode())
+    _hash_value(h, data)
+    # independent variables, weights, nan_policy, fit_kws, ...
+    _hash_value(h, kws)
+    return h
+
+def fit_key(model, data, params, method="leastsq", **kws):
+    """
+    Fingerprint of the inputs of model.fit(data, params, method=method, **kws):
+    the model and its code, the data, the initial parameters (values,
+    bounds and expressions), the method and every non-callable keyword.
+    """
+    h = _hash_inputs(model, data, method, kws)
+    h.update(params.dumps(sort_keys=True).encode())
+    return h.hexdigest()
+
+def warm_key(model, data, params, method="leastsq", **kws):
+    """
+    Like fit_key but without the initial values, fits that only differ
+    in their starting point share a warm key.
+    """
+    h = _hash_inputs(model, data, method, kws)
+    for name, par in params.items():
+        h.update(f"{name}|{par.vary}|{par.min}|{par.max}|{par.expr}".encode())
+    return h.hexdigest()
+
+
+class FitCache():
+    """
+    Cache of fit results keyed on fit_key. Recent results are kept in
+    memory, all results are written to a directory which is trimmed to
+    max_bytes by removing the least recently used files.
+
+    The sizes and LRU order of the files are scanned once when the cache
+    is created and then tracked in memory, so storing a result does not
+    scan the directory.
+    """
+    __slots__ = (
+        "directory",
+        "max_entries",
+        "max_bytes",
+        "_results",
+        "_warm",
+        "_files",
+        "_total_bytes",
+    )
+
+    def __init__(self, directory=FIT_CACHE_DIR, max_entries=64, max_bytes=100 * 2**20):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._results = OrderedDict()
+        self._warm = OrderedDict()
+        # key -> file size, least recently used first
+        self._files = OrderedDict()
+        self._total_bytes = 0
+        self._scan()
+
+    def fit(self, model, data, params, method="leastsq", warm_start=False, **kws):
+        """
+        Same as model.fit(data, params, method=method, **kws), but an
+        identical earlier fit is returned without calling the minimizer.
+
+        With warm_start, a fit of the same data and constraints from other
+        initial values starts from that fit's best values instead of the
+        given ones. The result is stored under the parameters it was
+        actually started from.
+        """
+        key = fit_key(model, data, params, method, **kws)
+        result = self.get(key, model, data, **kws)
+        if result is not None:
+            return result
+
+        wkey = warm_key(model, data, params, method, **kws)
+        if warm_start and wkey in self._warm:
+            params = params.copy()
+            for name, value in self._warm[wkey].items():
+                if params[name].vary and params[name].expr is None:
+                    params[name].set(value=value)
+            key = fit_key(model, data, params, method, **kws)
+            result = self.get(key, model, data, **kws)
+            if result is not None:
+                return result
+
+        result = model.fit(data, params, method=method, **kws)
+        result.fit_key = key
+        self.put(key, result)
+        self._warm[wkey] = {name: par.value for name, par in result.params.items()}
+        self._warm.move_to_end(wkey)
+        while len(self._warm) > self.max_entries:
+            self._warm.popitem(last=False)
+        return result
+
+    def get(self, key, model, data, **kws):
+        """Result stored under key from memory or disk, otherwise None."""
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if key not in self._files:
+            return None
+        path_filename = self._path(key)
+        try:
+            session = Session(path_filename)
+            # only the independent variables are evaluation keywords of the result
+            variables = {name: kws[name] for name in model.independent_vars if name in kws}
+            result = load_result(session, session.header["result"], "result", model, data, **variables)
+            os.utime(path_filename)
+        except (OSError, ValueError, KeyError):
+            self._forget(key)
+            return None
+        self._files.move_to_end(key)
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        """Store result in memory and on disk."""
+        self._remember(key, result)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entry, arrays = dump_result(result, "result")
+            save_session(self._path(key), {"result": entry}, arrays)
+            self._forget(key)
+            self._files[key] = os.path.getsize(self._path(key))
+            self._total_bytes += self._files[key]
+            self._evict()
+        except OSError:
+            # the cache is only an optimization
+            pass
+
+    def clear(self):
+        self._results.clear()
+        self._warm.clear()
+        for key in list(self._files):
+            self._remove(key)
+
+    def _remember(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".fit")
+
+    def _scan(self):
+        # build the LRU index from the file modification times
+        if not os.path.isdir(self.directory):
+            return
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".fit"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime_ns, entry.name[:-len(".fit")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._files[key] = size
+            self._total_bytes += size
+
+    def _forget(self, key):
+        self._total_bytes -= self._files.pop(key, 0)
+
+    def _remove(self, key):
+        self._forget(key)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # remove the least recently used files until the cache fits in max_bytes
+        while self._total_bytes > self.max_bytes and self._files:
+            self._remove(next(iter(self._files)))
@@ -0,0 +1,118 @@
+import numpy as np
+
+from lmfit import Model
+from lmfit.models import GaussianModel, LinearModel
+
+# user defined package
+from utils import gaussian, cumulative_integral, shirley, tougaard
+
+
+class GaussianPeakModel(GaussianModel):
+    """GaussianModel with an analytic Jacobian."""
+
+    def jacobian(self, params, x, **kwargs):
+        p = self.prefix
+        amplitude = params[p + "amplitude"].value
+        center = params[p + "center"].value
+        sigma = max(1e-15, params[p + "sigma"].value)
+        shape = gaussian(x, 1.0, center, sigma)
+        dx = x - center
+        return {
+            p + "amplitude": shape,
+            p + "center": amplitude * shape * dx / sigma**2,
+            p + "sigma": amplitude * shape * (dx * dx / sigma**3 - 1.0 / sigma),
+        }
+
+
+class LinearBackgroundModel(LinearModel):
+    """Linear background, slope * x + intercept."""
+
+    def __init__(self, prefix="bg_", **kwargs):
+        super().__init__(prefix=prefix, **kwargs)
+
+    def jacobian(self, params, x, **kwargs):
+        p = self.prefix
+        return {p + "slope": np.asarray(x, dtype=float), p + "intercept": np.ones(np.shape(x))}
+
+
+class ShirleyModel(Model):
+    """
+    Shirley background fitted together with the peaks, the spectrum
+    itself is passed as the independent variable y.
+    """
+
+    def __init__(self, prefix="bg_", **kwargs):
+        kwargs.update({"prefix": prefix, "independent_vars": ["x", "y"]})
+        super().__init__(shirley, **kwargs)
+        self.set_param_hint("k", min=0)
+
+    def guess(self, data, x, **kwargs):
+        # step height over the integral of the spectrum above the low end
+        low, high = (data[-1], data[0]) if x[0] > x[-1] else (data[0], data[-1])
+        # same integrand as shirley() with c = low, taken at the high x end
+        area = cumulative_integral(x, data - low)[np.argmax(x)]
+        pars = self.make_params(k=max(0.0, (high - low) / max(1e-12, area)), c=low)
+        return pars
+
+    def jacobian(self, params, x, y, **kwargs):
+        p = self.prefix
+        k = params[p + "k"].value
+        c = params[p + "c"].value
+        x_int = cumulative_integral(x, np.ones(np.shape(x)))
+        return {
+            p + "k": cumulative_integral(x, y) - c * x_int,
+            p + "c": 1.0 - k * x_int,
+        }
+
+
+class TougaardModel(Model):
+    """
+    Tougaard background with the universal loss function, C is fixed by
+    default. The spectrum is passed as the independent variable y.
+    """
+
+    def __init__(self, prefix="bg_", **kwargs):
+        kwargs.update({"prefix": prefix, "independent_vars": ["x", "y"]})
+        super().__init__(tougaard, **kwargs)
+        self.set_param_hint("B", min=0)
+        self.set_param_hint("C", value=1643.0, vary=False)
+
+    def guess(self, data, x, **kwargs):
+        # match the background to the high binding energy end
+        low, high = (data[-1], data[0]) if x[0] > x[-1] else (data[0], data[-1])
+        # the model integrates the raw spectrum, the offset c takes the low end
+        end = tougaard(x, data, 1.0)[np.argmax(x)]
+        return self.make_params(B=max(0.0, (high - low) / max(1e-12, end)), c=low)
+
+    def jacobian(self, params, x, y, **kwargs):
+        p = self.prefix
+        B = params[p + "B"].value
+        C = params[p + "C"].value
+        kernel = tougaard(x, y, 1.0, C)
+        jac = {p + "B": kernel, p + "c": np.ones(np.shape(x))}
+        if params[p + "C"].vary:
+            step = 1e-6 * max(1.0, abs(C))
+            jac[p + "C"] = B * (tougaard(x, y, 1.0, C + step) - kernel) / step
+        return jac
+
+
+def jacobian_fit_kws(model):
+    """
+    fit_kws for Model.fit(..., method="leastsq") using the analytic
+    Jacobian of every component, e.g.
+
+        model = GaussianPeakModel() + ShirleyModel()
+        model.fit(y0, pars, x=x0, y=y0, fit_kws=jacobian_fit_kws(model))
+    """
+    def dfun(params, data, weights, **kwargs):
+        columns = {}
+        for component in model.components:
+            columns.update(component.jacobian(params, **kwargs))
+        names = [name for name, par in params.items() if par.vary and par.expr is None]
+        # residual is data - model
+        jac = -np.array([columns[name] for name in names])
+        if weights is not None:
+            jac *= weights
+        return jac
+
+    return {"Dfun": dfun, "col_deriv": True}
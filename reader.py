@@ -4,26 +4,35 @@ import numpy as np
 
 def read_file(path_filename):
     return Reader(path_filename)
+
+def read_header(path_filename):
+    """
+    Read only the [Info] header and the region metadata of a file,
+    the data blocks are skipped without parsing.
+    """
+    return Reader(path_filename, header_only=True)
     
 
 class Reader():
     __slots__ = (
+        "info",
         "metadata",
         "spectrum",
         "path_filename",
     )
 
-    def __init__(self, path_filename=None):
+    def __init__(self, path_filename=None, header_only=False):
         if path_filename is None:
             pass
         else: 
             self.path_filename = path_filename
+            self.info = {}
             self.metadata = {}
             self.spectrum = {}
-            self._read_txt(path_filename)
+            self._read_txt(path_filename, header_only)
             self._spectrum2array()
          
-    def _read_txt(self, path_filename):
+    def _read_txt(self, path_filename, header_only=False):
         """
         Function read data and metadata from one file 
         
@@ -31,6 +40,8 @@ class Reader():
         
         Args:
         path_filename (str): filename and path to the file 
+        header_only (bool): skip the data blocks, stop reading at the
+        data block of the last region
         
         Returns:
         Tuple(data, metadata): spectrum are save in data, while other
@@ -40,9 +51,13 @@ class Reader():
         if os.path.isfile(path_filename):  
             with open(path_filename, "r") as f:
                 f.readline() # skip first line [Info]
-                num_regions = int(f.readline().split("=")[1].strip()) # check number of regions
+                key, value = f.readline().split("=")
+                num_regions = int(value.strip()) # check number of regions
+                self.info[key.strip()] = value.strip()
                 # print(num_regions)
-                version = f.readline().split("=")[1].strip() # check the file version
+                key, value = f.readline().split("=")
+                version = value.strip() # check the file version
+                self.info[key.strip()] = version
                 # print(version)
                 region_head =re.compile(r"^\[Region ([0-9]*)\]$") 
                 if version in ["1.3.1"]:
@@ -67,6 +82,11 @@ class Reader():
                             continue
                         elif line in spectrum_section:
                             # print(line)
+                            if header_only:
+                                if int(region_num) >= num_regions:
+                                    break
+                                current_section = "skip"
+                                continue
                             current_section = "spectrum"
                             self.spectrum[region_key] = list()
                             continue
@@ -0,0 +1,135 @@
+import os
+import json
+import numpy as np
+
+from lmfit import Parameters
+from lmfit.model import ModelResult
+
+MAGIC = b"APPDEMO\x01"
+# array blocks start on multiples of ALIGN bytes
+ALIGN = 64
+
+# ModelResult attributes saved in the JSON header and as arrays
+RESULT_SCALARS = ("aborted", "aic", "bic", "chisqr", "errorbars", "ier",
+    "lmdif_message", "message", "method", "nan_policy", "ndata", "nfev",
+    "nfree", "nvarys", "redchi", "rsquared", "success", "var_names",
+    "init_values", "best_values", "fit_key")
+RESULT_ARRAYS = ("best_fit", "init_fit", "residual", "covar")
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def _to_json(value):
+    """Convert numpy scalars and arrays inside value to plain python."""
+    if isinstance(value, dict):
+        return {key: _to_json(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(val) for val in value]
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    if isinstance(value, bytes):
+        return value.decode("ascii", errors="replace")
+    return value
+
+def save_session(path_filename, header, arrays):
+    """
+    Write a session file: a JSON header followed by the raw arrays.
+
+    Args:
+      path_filename (str): file to write, replaced atomically
+      header (dict): JSON serializable session description
+      arrays (dict): name -> np.array
+    """
+    table = {}
+    blocks = []
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        offset = _align(offset)
+        table[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        blocks.append((offset, arr))
+        offset += arr.nbytes
+    head = json.dumps({"header": _to_json(header), "arrays": table}).encode()
+    data_start = _align(len(MAGIC) + 8 + len(head))
+
+    tmp_filename = path_filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(head)).tobytes())
+        f.write(head)
+        for block_offset, arr in blocks:
+            f.seek(data_start + block_offset)
+            f.write(arr.tobytes())
+    os.replace(tmp_filename, path_filename)
+
+
+class Session():
+    """
+    Session file opened for reading. Only the header is read on open, each
+    array is read from its block when it is asked for. Nothing keeps the
+    file open, so it can be saved over afterwards (also on Windows).
+    """
+    __slots__ = (
+        "path_filename",
+        "header",
+        "_table",
+        "_data_start",
+    )
+
+    def __init__(self, path_filename):
+        self.path_filename = path_filename
+        with open(path_filename, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path_filename} is not a session file")
+            head_size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            head = json.loads(f.read(head_size).decode())
+        self.header = head["header"]
+        self._table = head["arrays"]
+        self._data_start = _align(len(MAGIC) + 8 + head_size)
+
+    def __contains__(self, name):
+        return name in self._table
+
+    def array(self, name):
+        entry = self._table[name]
+        shape = tuple(entry["shape"])
+        if np.prod(shape) == 0:
+            return np.empty(shape, dtype=entry["dtype"])
+        arr = np.fromfile(self.path_filename, dtype=entry["dtype"], count=int(np.prod(shape)),
+            offset=self._data_start + entry["offset"])
+        return arr.reshape(shape)
+
+
+def dump_result(result, prefix):
+    """
+    Split a ModelResult into a JSON header entry and arrays named prefix.*.
+    """
+    entry = {
+        "params": result.params.dumps(),
+        "init_params": result.init_params.dumps(),
+    }
+    for attr in RESULT_SCALARS:
+        if hasattr(result, attr):
+            entry[attr] = getattr(result, attr)
+    arrays = {}
+    for attr in RESULT_ARRAYS:
+        value = getattr(result, attr, None)
+        if value is not None:
+            arrays[f"{prefix}.{attr}"] = np.asarray(value)
+    return entry, arrays
+
+def load_result(session, entry, prefix, model, data, **kws):
+    """
+    Rebuild a ModelResult saved by dump_result without refitting.
+    """
+    params = Parameters().loads(entry["params"])
+    result = ModelResult(model, params, data=data, fcn_kws=kws)
+    result.init_params = Parameters().loads(entry["init_params"])
+    for attr in RESULT_SCALARS:
+        if attr in entry:
+            setattr(result, attr, entry[attr])
+    for attr in RESULT_ARRAYS:
+        name = f"{prefix}.{attr}"
+        setattr(result, attr, session.array(name) if name in session else None)
+    return result
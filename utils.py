@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import pandas as pd
 import time
@@ -19,23 +20,115 @@ def instr_delta_e(bl_delta_e, conv_delta_e):
     else:
         return np.nan
 
+K_B = 8.617e-5 # ev/K
+S2PI = np.sqrt(2 * np.pi)
+TINY = 1e-15
+
+
+class Workspace():
+    """
+    Reusable scratch arrays for the fused kernels below.
+
+    Keep one instance per fit and pass it as `work` so repeated
+    evaluations by the minimizer do not allocate new temporaries.
+    """
+    __slots__ = ("_buffers",)
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, size):
+        buf = self._buffers.get(name)
+        if buf is None or buf.size != size:
+            buf = np.empty(size)
+            self._buffers[name] = buf
+        return buf
+
+
+def _fermi_dirac_into(x, tempr, Ef, out):
+    """
+    Evaluate the Fermi Dirac function into `out`.
+
+    Uses 1/(exp(-t)+1) = (1+tanh(t/2))/2, which never overflows even
+    when kT goes to zero.
+    """
+    kt = K_B * tempr
+    np.subtract(x, Ef, out=out)
+    out *= 0.5 / max(1e-12, kt)
+    np.tanh(out, out=out)
+    out += 1.0
+    out *= 0.5
+    return out
+
+def _gaussian_into(x, amplitude, center, sigma, out):
+    """Evaluate the area normalized Gaussian into `out`."""
+    np.subtract(x, center, out=out)
+    np.square(out, out=out)
+    out *= -1.0 / max(TINY, 2 * sigma * sigma)
+    np.exp(out, out=out)
+    out *= amplitude / max(TINY, S2PI * sigma)
+    return out
+
 # Fermi–Dirac distrubution
 def fermi_dirac(x, tempr, Ef):
     """Fermi Dirac distribution function."""
-    k_b = 8.617e-5 # ev/K
-    kt = k_b * tempr
-    # Ef = 0 # eV
-    return 1.0 /(np.exp(-(x-Ef)/max(1e-12, kt)) + 1)
+    x = np.asarray(x, dtype=float)
+    return _fermi_dirac_into(x, tempr, Ef, np.empty(x.shape))
+
+def gaussian(x, amplitude=1.0, center=0.0, sigma=1.0):
+    """
+    Gaussian function, same parameters as lmfit.lineshapes.gaussian
+    but evaluated with a single output allocation.
+    """
+    x = np.asarray(x, dtype=float)
+    return _gaussian_into(x, amplitude, center, sigma, np.empty(x.shape))
 
-def convolve(arr, kernel):
+def convolve(arr, kernel, work=None):
     """Simple convolution of two arrays."""
     npts = min(arr.size, kernel.size)
-    pad = np.ones(npts)
-    tmp = np.concatenate((pad*arr[0], arr, pad*arr[-1]))
+    if work is None:
+        tmp = np.empty(arr.size + 2*npts)
+    else:
+        tmp = work.get("pad", arr.size + 2*npts)
+    tmp[:npts] = arr[0]
+    tmp[npts:npts+arr.size] = arr
+    tmp[npts+arr.size:] = arr[-1]
     out = np.convolve(tmp, kernel, mode='valid')
     noff = int((len(out) - npts) / 2)
     return out[noff:noff+npts]
 
+class Convolver():
+    """
+    convolve bound to a Workspace, for use as the operator of
+    CompositeModel so the padding buffer is reused by every evaluation.
+    Named and printed as convolve in model reports.
+    """
+    __slots__ = ("work",)
+    __name__ = "convolve"
+
+    def __init__(self, work=None):
+        self.work = work if work is not None else Workspace()
+
+    def __call__(self, arr, kernel):
+        return convolve(arr, kernel, work=self.work)
+
+    def __repr__(self):
+        return self.__name__
+
+def fermi_gauss(x, tempr, Ef, amplitude, center, sigma, work=None):
+    """
+    Fermi Dirac function convolved with a Gaussian, equivalent to
+    CompositeModel(Model(fermi_dirac), Model(gaussian), convolve).
+
+    With a Workspace as `work` only the convolution result is allocated.
+    """
+    x = np.asarray(x, dtype=float)
+    if work is None:
+        work = Workspace()
+    fd = _fermi_dirac_into(x, tempr, Ef, work.get("fermi_dirac", x.size))
+    gs = _gaussian_into(x, amplitude, center, sigma, work.get("gaussian", x.size))
+    return convolve(fd, gs, work=work)
+
 def sigma2fwhm(sigma):
 	fwhm = 2.3548*sigma
 	return fwhm
@@ -56,6 +149,79 @@ def normalize(x):
     x = np.asarray(x)
     return (x - x.min()) / (np.ptp(x))
 
+def cumulative_integral(x, f):
+    """
+    Trapezoidal integral of f from the lowest x up to every point, in
+    the order of x. O(n) with a single cumulative sum.
+    """
+    x = np.asarray(x, dtype=float)
+    f = np.asarray(f, dtype=float)
+    out = np.empty(x.shape)
+    out[0] = 0.0
+    np.cumsum(0.5 * (f[1:] + f[:-1]) * np.diff(x), out=out[1:])
+    if x[0] > x[-1]:
+        # integral starts from the low x end of the spectrum
+        out -= out[-1]
+    return out
+
+def shirley(x, y, k=0.0, c=0.0):
+    """
+    Shirley background for binding energy spectra,
+    B(x) = c + k * integral of (y - c) from the low binding energy side.
+    Linear in k and c, so it can be fitted together with the peaks
+    instead of the iterative shirley_baseline.
+    """
+    return c + k * (cumulative_integral(x, y) - c * cumulative_integral(x, np.ones(np.shape(x))))
+
+def tougaard_kernel(x, y, C=1643.0):
+    """
+    Integral of the universal Tougaard loss function T/(C+T^2)^2 times y
+    over the lower binding energies. x should be evenly spaced.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    order = slice(None, None, -1) if x[0] > x[-1] else slice(None)
+    step = abs(x[-1] - x[0]) / max(1, x.size - 1)
+    loss = np.arange(x.size) * step
+    loss = loss / (C + loss * loss)**2
+    out = np.convolve(y[order], loss)[:x.size] * step
+    return out[order]
+
+@functools.lru_cache(maxsize=8)
+def _tougaard_kernel_cached(x_bytes, y_bytes, C):
+    out = tougaard_kernel(np.frombuffer(x_bytes), np.frombuffer(y_bytes), C)
+    out.setflags(write=False)
+    return out
+
+def tougaard(x, y, B=0.0, C=1643.0, c=0.0):
+    """
+    Tougaard background, B(x) = c + B * tougaard_kernel(x, y, C).
+    The loss integral only depends on the data and C, it is computed
+    once per fit and reused by every following evaluation.
+    """
+    x = np.ascontiguousarray(x, dtype=float)
+    y = np.ascontiguousarray(y, dtype=float)
+    return c + B * _tougaard_kernel_cached(x.tobytes(), y.tobytes(), float(C))
+
+def decimate(x, y, npts):
+    """
+    Reduce a curve to about npts points for previews. Each bin keeps
+    its minimum and maximum (in order), so narrow peaks survive.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if y.size <= npts:
+        return x, y
+    nbins = max(1, npts // 2)
+    step = y.size // nbins
+    xb = x[:step*nbins].reshape(nbins, step)
+    yb = y[:step*nbins].reshape(nbins, step)
+    imin = yb.argmin(axis=1)
+    imax = yb.argmax(axis=1)
+    idx = np.stack((np.minimum(imin, imax), np.maximum(imin, imax)), axis=1)
+    rows = np.arange(nbins)[:, None]
+    return xb[rows, idx].ravel(), yb[rows, idx].ravel()
+
 
 def shirley_baseline(dat, limits=None, maxit = 50, err = 1e-6, display=False):
     ''' 